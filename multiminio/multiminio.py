@@ -1,48 +1,68 @@
+import inspect
 import logging
-from enum import auto
-from threading import RLock
-from typing import Callable, Collection, NamedTuple, Optional, Tuple, Type
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import wraps
+from threading import Event, RLock
+from types import MethodType
+from typing import Callable, Collection, Dict, List, Optional, Tuple
 
-import requests
+import certifi
+import urllib3
 from minio import Minio
 from minio.error import InvalidResponseError, MinioException, S3Error
-from streamerate import stream
-from strenum import StrEnum
-from tsx import TS
 
+if sys.version_info >= (3, 11):
+    from enum import StrEnum
+else:
+    from strenum import StrEnum
 
-class HealthStatus(NamedTuple):
+
+@dataclass(slots=True, frozen=True)
+class HealthStatus:
     status_code: int | Exception
     response_time: Optional[float]
 
 
 class LoadBalanceType(StrEnum):
-    FALLBACK = auto()
-    ROUND_ROBIN = auto()
-    RANDOM = auto()
+    # Explicit values: enum.StrEnum's auto() lowercases the member name while strenum's keeps it, so auto() would differ by Python version
+    FALLBACK = "FALLBACK"
+    ROUND_ROBIN = "ROUND_ROBIN"
+    RANDOM = "RANDOM"
+
+
+@dataclass(slots=True)
+class _ClientRec:
+    """Everything the request and health check paths need about a single client, kept in one record."""
+
+    client: Minio
+    url: str
+    health_url: str
+    bound: Dict[str, Callable] = field(default_factory=dict)  # Client methods resolved by _bind_method, by method name
 
 
 FunctionType = Minio.__init__.__class__
 
+# Public Minio methods which get routed through the fallback mechanism. Computed once at import time.
+# The class dicts are inspected directly, so no descriptor (e.g. a property) gets evaluated on the class.
+_WRAPPED_METHODS = tuple(
+    sorted({name for cls in Minio.__mro__ for name, member in vars(cls).items() if not name.startswith("_") and inspect.isfunction(member)})
+)
+
 
 class MultiMinio(Minio):
     HEALTH_CHECK_TIMEOUT = 5.0
     DEFAULT_FALLBACK_TIMEOUT = 60.0
     HEALTH_CHECK_HEARTBEAT = 300.0
-    MAX_TRY_TIMEOUT = 60.0
+    MAX_TRY_TIMEOUT = 60.0  # Deprecated and unused, kept for backward compatibility
     HEALTH_CHECK_INTERVAL = 10.0
+    MAX_CIRCUIT_COOLDOWN = 60.0  # Upper bound of the exponential backoff before an unhealthy client is probed again
     MAX_COMPATIBILITY = True  # If True, the MultiMinio instance will try to be max compatible with the received Minio instances, but possibly slightly slower
 
-    def __new__(cls: type["MultiMinio"], *args, **kwargs) -> "MultiMinio":
-        # Get all methods of Minio class
-        all_attributes_and_methods = dir(Minio)
-        public_methods = [attr for attr in all_attributes_and_methods if callable(getattr(Minio, attr)) and not attr.startswith("_")]
-        instance = super().__new__(cls) # pylint: disable=no-value-for-parameter
-        for method_name in public_methods:
-            method = getattr(Minio, method_name)
-            setattr(instance, method_name, instance._method_wrapper(method))
-        return instance
-
     def __init__(
         self,
         clients: Collection[Minio],
@@ -50,53 +70,74 @@ class MultiMinio(Minio):
         fallback_timeout: float = DEFAULT_FALLBACK_TIMEOUT,
         health_check_timeout: float = HEALTH_CHECK_TIMEOUT,
         health_check_heartbeat: float = HEALTH_CHECK_HEARTBEAT,
-        max_try_timeout: float = MAX_TRY_TIMEOUT,
+        max_try_timeout: Optional[float] = None,
         health_check_interval: float = HEALTH_CHECK_INTERVAL,
-        ts_type: Type[TS] = TS,
+        ts_type: Optional[type] = None,
     ):
         """
         :param clients: List of Minio client instances
         :param fallback_timeout: The maximum time to wait for a healthy client to become available.
         :param health_check_timeout: The timeout for the health check request.
         :param health_check_heartbeat: The interval between health checks.
-        :param max_try_timeout: The maximum time to wait for a single request to complete.
+        :param max_try_timeout: Deprecated and ignored; the whole call, fallbacks included, is bounded by fallback_timeout.
         :param health_check_interval: The interval between health checks (it won't do more than one health c heck within this interval)
-        :param ts_type: The timestamp type to use for time getting.
+        :param ts_type: Deprecated and ignored; time is measured with time.monotonic().
         """
-        self._clients = tuple(clients)
-        assert len(self._clients) > 0
+        if max_try_timeout is not None:
+            warnings.warn("The max_try_timeout parameter is deprecated and ignored; calls are bounded by fallback_timeout", DeprecationWarning, stacklevel=2)
+        if ts_type is not None:
+            warnings.warn("The ts_type parameter is deprecated and ignored; time is measured with time.monotonic()", DeprecationWarning, stacklevel=2)
+        self._recs: Tuple[_ClientRec, ...] = tuple(self._build_client_rec(client) for client in clients)
+        assert len(self._recs) > 0
+        # Clients sharing the same endpoint (e.g. with different credentials) are probed only once per health check
+        self._url_to_indices: Dict[str, List[int]] = {}
+        for i, rec in enumerate(self._recs):
+            self._url_to_indices.setdefault(rec.url, []).append(i)
         self._load_balance_type = load_balance_type
         assert load_balance_type == LoadBalanceType.FALLBACK, "Only fallback load balancing is supported at the moment"
         self._fallback_timeout = fallback_timeout
         self._health_check_timeout = health_check_timeout
         self._health_check_heartbeat = health_check_heartbeat
-        self._max_try_timeout = max_try_timeout
         self._health_check_min_interval = health_check_interval
         assert self._health_check_heartbeat >= self._health_check_min_interval * 2
         assert self._health_check_min_interval >= self._health_check_timeout * 2
         self._current_client_index = 0  # Start with the first client - valid only for fallback load balancing
-        self._ts_type = ts_type
-        self._last_health_check_ts = TS(0)
-        self._current_fail_ts: Optional[TS] = None
+        self._last_health_check_mono: float = 0.0
+        self._current_fail_ts: Optional[float] = None  # time.monotonic() of the first failed try since the last success
         self._health_statuses: Optional[Tuple[HealthStatus, ...]] = None
+        # Circuit-breaker state: a failing client isn't probed over the network again until its cooldown expires
+        self._cooldown_until: List[float] = [0.0] * len(self._recs)
+        self._consecutive_fails: List[int] = [0] * len(self._recs)
+        self._last_failures: List[Optional[HealthStatus]] = [None] * len(self._recs)
         self._lock = RLock()
+        self._closed = False
+        self._probe_inflight: Optional[Event] = None
+        # Resolved once, so the request path doesn't need to branch on MAX_COMPATIBILITY
+        self._bind_method: Callable[[Minio, Callable], Callable] = self._bind_compat if self.MAX_COMPATIBILITY else self._bind_fast
+        # Same CA configuration as the pool Minio builds for its own requests
+        self._probe_pm = urllib3.PoolManager(
+            num_pools=len(self._recs),
+            maxsize=1,
+            timeout=self._health_check_timeout,
+            retries=False,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+        )
+        self._health_executor = ThreadPoolExecutor(max_workers=min(len(self._recs), 32), thread_name_prefix="mm-health")
 
-    def _method_wrapper(self, method: Callable) -> Callable:
-        assert isinstance(method, FunctionType)
+    @classmethod
+    def _build_client_rec(cls, client: Minio) -> _ClientRec:
+        url = cls._get_client_url(client)
+        return _ClientRec(client=client, url=url, health_url=f"{url}/minio/health/live")
 
-        def wrapper(*args, **kwargs):
-            assert isinstance(method, FunctionType)
-            return self._execute_with_fallback(method, *args, **kwargs)
-
-        return wrapper
-
-    def _get_current_client(self) -> Minio:
-        with self._lock:
-            now_ts = self._ts_type.now()
-            health_check_age = now_ts - self._last_health_check_ts
-            if self._current_client_index > 0 and health_check_age > self._health_check_heartbeat:
-                return self._get_next_client()
-            return self._clients[self._current_client_index]
+    def _get_current_client_index(self) -> int:
+        # Lock-free fast path: reading an int attribute is atomic under the GIL
+        idx = self._current_client_index
+        if idx == 0:
+            return 0
+        if time.monotonic() - self._last_health_check_mono > self._health_check_heartbeat:
+            return self._get_next_client_index()
+        return idx
 
     def _execute_with_fallback(self, func: Callable, *args, **kwargs):
         """
@@ -107,76 +148,147 @@ class MultiMinio(Minio):
         :param kwargs: The keyword arguments to pass to the function
         :return: The result of the first successful execution or raises an exception if all attempts fail.
         """
-        start_try_ts = self._ts_type.now()
-        current_client = self._get_current_client()
-        while self._ts_type.now() - start_try_ts < self._fallback_timeout:
+        fname = func.__name__
+        if self._closed:
+            raise MinioException(f"Cannot execute {fname}: this MultiMinio instance is closed")
+        start_try_ts = time.monotonic()
+        deadline = start_try_ts + self._fallback_timeout
+        current_idx = self._get_current_client_index()
+        while time.monotonic() < deadline:
+            rec = self._recs[current_idx]
+            method = rec.bound.get(fname) or rec.bound.setdefault(fname, self._bind_method(rec.client, func))
             try:
-                if self.MAX_COMPATIBILITY:
-                    method = getattr(current_client, func.__name__)
-                    result = method(*args, **kwargs)
-                else:
-                    result = func(current_client, *args, **kwargs)
-                with self._lock:
-                    self._current_fail_ts = None
-                return result
-            except S3Error:
-                raise
-            except InvalidResponseError:
+                result = method(*args, **kwargs)
+            except (S3Error, InvalidResponseError):
                 raise
             except Exception as e:  # pylint: disable=broad-exception-caught
                 with self._lock:
                     if self._current_fail_ts is None:
                         self._current_fail_ts = start_try_ts
-                    url = self._get_client_url(current_client)
-                    logging.error(f"Minio client {url} when calling: \n{func.__name__}({args}, {kwargs})\nfailed with {e}.\nSearching for a healthy client...")
-                    next_client = self._get_next_client()
-                next_url = self._get_client_url(next_client)
-                logging.error(f"Found healthy client {next_url}. Continuing...")
-                current_client = next_client
-        raise MinioException(f"Failed to execute:\n{func.__name__}({args}, {kwargs})\n on all Minio clients within {self._max_try_timeout:.3f} seconds")
-
-    def _get_next_client(self) -> Minio:
+                # Arguments aren't logged: they may hold large payloads (e.g. put_object data) which shouldn't be serialized into logs
+                logging.error("Minio client %s when calling %s failed with %s. Searching for a healthy client...", rec.url, fname, e)
+                current_idx = self._get_next_client_index(failed_index=current_idx)
+                logging.error("Found healthy client %s. Continuing...", self._recs[current_idx].url)
+                continue
+            if self._current_fail_ts is not None:
+                with self._lock:
+                    self._current_fail_ts = None
+            return result
+        raise MinioException(f"Failed to execute {fname} on all Minio clients within {self._fallback_timeout:.3f} seconds")
+
+    @staticmethod
+    def _bind_compat(client: Minio, func: Callable) -> Callable:
+        """Use the client's own attribute, so Minio subclasses and mocks with overridden methods are honored."""
+        return getattr(client, func.__name__)
+
+    @staticmethod
+    def _bind_fast(client: Minio, func: Callable) -> Callable:
+        """Bind the original Minio function directly to the client, bypassing the client's attribute lookup."""
+        return MethodType(func, client)
+
+    def _get_next_client_index(self, failed_index: Optional[int] = None) -> int:
+        """
+        Get the index of the next available client. Raises MinioException if none became available within the fallback timeout.
+
+        :param failed_index: The client which has just failed. While the cached health statuses are fresh, any other healthy client is preferred to it.
         """
-        Get the next available client. Return None if none are available.
+        start_ts = self._current_fail_ts if self._current_fail_ts is not None else time.monotonic()
+        # Once no client is known to be healthy, open circuits must not hide a client that comes back while we wait
+        bypass_circuit = False
+        while True:
+            health_statuses = self._retrieve_clients_health(bypass_circuit=bypass_circuit)
+            healthy_index = None
+            for i, health_status in enumerate(health_statuses):
+                if health_status.status_code == 200:
+                    healthy_index = i
+                    if i != failed_index:
+                        break
+            if healthy_index is not None:
+                with self._lock:
+                    self._current_client_index = healthy_index
+                return healthy_index
+            down_time = time.monotonic() - start_ts
+            if down_time > self._fallback_timeout:
+                error_msg = f"All Minio clients are down for {down_time:.3f} seconds"
+                raise MinioException(error_msg)
+            bypass_circuit = True
+
+    def _retrieve_clients_health(self, bypass_circuit: bool = False) -> Tuple[HealthStatus, ...]:
         """
-        start_ts = self._current_fail_ts or self._ts_type.now()
-        with self._lock:
-            while True:
-                health_statuses = self._retrieve_clients_health()
-                for i, health_status in enumerate(health_statuses):
-                    if health_status.status_code == 200:
-                        self._current_client_index = i
-                        return self._clients[self._current_client_index]
-                now_ts = self._ts_type.now()
-                down_time = float(now_ts - start_ts)
-                if down_time > self._fallback_timeout:
-                    error_msg = f"All Minio clients are down for {down_time:.3f} seconds"
-                    raise MinioException(error_msg)
-
-    def _retrieve_clients_health(self) -> Tuple[HealthStatus, ...]:
-        health_status_age = self._ts_type.now() - self._last_health_check_ts
-        if self._last_health_check_ts > TS(0) and health_status_age < self._health_check_min_interval:
-            assert self._health_statuses is not None
-            return self._health_statuses
-        pool_size = min(len(self._clients), 32)
-        statuses = tuple(stream(self._clients).mtmap(self._check_health_status, poolSize=pool_size))
-        self._last_health_check_ts = self._ts_type.now()
-        self._health_statuses = statuses
-        return statuses
-
-    def _check_health_status(self, client: Minio) -> HealthStatus:
-        url = self._get_client_url(client)
-        t0 = self._ts_type.now()
+        Return the cached health statuses if they are fresh, otherwise probe all the clients.
+        Concurrent callers are coalesced: only one of them runs the probes while the others wait for its result.
+
+        :param bypass_circuit: Probe the clients over the network even if their circuit breaker is open.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now - self._last_health_check_mono < self._health_check_min_interval and self._health_statuses is not None:
+                    return self._health_statuses
+                probe_inflight = self._probe_inflight
+                if probe_inflight is None:
+                    self._probe_inflight = Event()
+                    break
+            probe_inflight.wait(self._health_check_timeout + 1)
+            health_statuses = self._health_statuses
+            if health_statuses is not None:
+                return health_statuses
+
+        try:
+            futures = {
+                url: self._health_executor.submit(self._check_health_status, indices[0], bypass_circuit) for url, indices in self._url_to_indices.items()
+            }
+            # All probes are in flight at once; don't let a single stalled peer hold the whole check past its timeout
+            wait(futures.values(), timeout=self._health_check_timeout)
+            health_by_index: Dict[int, HealthStatus] = {}
+            for url, future in futures.items():
+                health_status = self._collect_health_status(future)
+                for i in self._url_to_indices[url]:
+                    health_by_index[i] = health_status
+            statuses = tuple(health_by_index[i] for i in range(len(self._recs)))
+            with self._lock:
+                self._last_health_check_mono = time.monotonic()
+                self._health_statuses = statuses
+            return statuses
+        finally:
+            with self._lock:
+                probe_inflight, self._probe_inflight = self._probe_inflight, None
+            assert probe_inflight is not None
+            probe_inflight.set()
+
+    def _collect_health_status(self, future: "Future[HealthStatus]") -> HealthStatus:
+        if future.done():
+            return future.result()
+        error = TimeoutError(f"Health check didn't complete within {self._health_check_timeout:.3f} seconds")
+        return HealthStatus(status_code=error, response_time=self._health_check_timeout)
+
+    def _check_health_status(self, index: int, bypass_circuit: bool = False) -> HealthStatus:
+        last_failure = self._last_failures[index]
+        if not bypass_circuit and last_failure is not None and time.monotonic() < self._cooldown_until[index]:
+            return last_failure
+        rec = self._recs[index]
+        t0 = time.monotonic()
         try:
-            response = requests.get(f"{url}/minio/health/live", timeout=self._health_check_timeout)
-            dt = float(self._ts_type.now() - t0)
-            logging.warning(f"Health check for {url} took {dt:.3f} seconds")
-            health_status = HealthStatus(status_code=response.status_code, response_time=dt)
-            return health_status
-        except requests.RequestException as e:
-            dt = float(self._ts_type.now() - t0)
+            response = self._probe_pm.request("GET", rec.health_url)
+            dt = time.monotonic() - t0
+            logging.warning("Health check for %s took %.3f seconds", rec.url, dt)
+            health_status = HealthStatus(status_code=response.status, response_time=dt)
+        except urllib3.exceptions.HTTPError as e:
+            dt = time.monotonic() - t0
             health_status = HealthStatus(status_code=e, response_time=dt)
-            return health_status
+        self._update_circuit(index, health_status)
+        return health_status
+
+    def _update_circuit(self, index: int, health_status: HealthStatus) -> None:
+        if health_status.status_code == 200:
+            self._consecutive_fails[index] = 0
+            self._cooldown_until[index] = 0.0
+            self._last_failures[index] = None
+            return
+        self._consecutive_fails[index] += 1
+        cooldown = min(self.MAX_CIRCUIT_COOLDOWN, 2.0 ** self._consecutive_fails[index])
+        self._cooldown_until[index] = time.monotonic() + cooldown
+        self._last_failures[index] = health_status
 
     @staticmethod
     def _get_client_url(client: Minio) -> str:
@@ -189,5 +301,48 @@ class MultiMinio(Minio):
             url = f"{_protocol}://{_host}"
         return url
 
+    def close(self) -> None:
+        """Release the pooled HTTP connections and the worker threads used for health checks. Safe to call more than once."""
+        self._closed = True
+        health_executor = getattr(self, "_health_executor", None)
+        if health_executor is not None:
+            health_executor.shutdown(wait=False)
+        probe_pm = getattr(self, "_probe_pm", None)
+        if probe_pm is not None:
+            probe_pm.clear()
+
+    def __enter__(self) -> "MultiMinio":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     def __del__(self):
-        """This override is needed to avoid calling the Minio.__del__ which requires some more instantiations and fails for this instance."""
+        """
+        This override is needed to avoid calling the Minio.__del__ which requires some more instantiations and fails for this instance.
+        It only releases the health check resources, on a best-effort basis; use close() or the context manager for deterministic cleanup.
+        """
+        try:
+            self.close()
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+
+
+def _method_wrapper(method: Callable) -> Callable:
+    assert isinstance(method, FunctionType)
+
+    @wraps(method)
+    def wrapper(self: MultiMinio, *args, **kwargs):
+        return self._execute_with_fallback(method, *args, **kwargs)  # pylint: disable=protected-access
+
+    return wrapper
+
+
+def _install_wrappers() -> None:
+    for method_name in _WRAPPED_METHODS:
+        # Never shadow what MultiMinio defines itself (e.g. close(), should Minio ever get a public method with that name)
+        if method_name not in vars(MultiMinio):
+            setattr(MultiMinio, method_name, _method_wrapper(getattr(Minio, method_name)))
+
+
+_install_wrappers()
@@ -4,7 +4,6 @@ from unittest.mock import patch
 
 import certifi
 import pytest
-import requests
 import urllib3
 from minio import InvalidResponseError, Minio, S3Error
 from minio.error import MinioException
@@ -13,11 +12,10 @@ from multiminio import MultiMinio
 from tests.functional.config import CONFIG
 
 # Mocking a successful health check
-SUCCESS_HEALTH = requests.Response()
-SUCCESS_HEALTH.status_code = 200
+SUCCESS_HEALTH = urllib3.HTTPResponse(status=200)
 
 # Mocking a failed health check
-FAIL_HEALTH = requests.RequestException()
+FAIL_HEALTH = urllib3.exceptions.HTTPError()
 
 EXPECTED_RESULT = "test result"
 BUCKET1 = "bucket1"
@@ -30,7 +28,7 @@ class TestFunctionalMultiMinio:
     @staticmethod
     @pytest.fixture(scope="function")
     def patched_minio(client1, client2):
-        with patch("multiminio.multiminio.requests.get") as mock_get:
+        with patch("multiminio.multiminio.urllib3.PoolManager.request") as mock_get:
             # First call to health check returns a timeout for client1 and success for client2
             mock_get.side_effect = [FAIL_HEALTH, SUCCESS_HEALTH]
             yield MultiMinio([client1, client2])
@@ -1,34 +1,48 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
 from unittest.mock import MagicMock, call, patch
 from urllib.parse import ParseResult
 
+import certifi
 import pytest
-import requests
+import urllib3
 from minio import Minio
+from minio.error import MinioException
 
 from multiminio import MultiMinio
+from multiminio.multiminio import _WRAPPED_METHODS, LoadBalanceType
 
 # Mocking a successful health check
-SUCCESS_HEALTH = requests.Response()
-SUCCESS_HEALTH.status_code = 200
+SUCCESS_HEALTH = urllib3.HTTPResponse(status=200)
 
 # Mocking a failed health check
-FAIL_HEALTH = requests.RequestException()
+FAIL_HEALTH = urllib3.exceptions.HTTPError()
 
 EXPECTED_RESULT = "test result"
 BUCKET1 = "bucket1"
 OBJECT1 = "path1/object1"
 
 
+def _mock_client(url: str) -> MagicMock:
+    """Build a Minio client mock whose base URL resolves to the given url."""
+    client = MagicMock(spec=Minio)
+    base_url = MagicMock(spec=ParseResult)
+    base_url.geturl.return_value = url
+    client._base_url = base_url
+    return client
+
+
 class TestMultiMinio:
     @pytest.fixture(scope="function")
     def mock_request_get(self, mocker):
-        """Mock the requests.get function to return a predetermined health check status."""
-        mock_get = mocker.patch("requests.get")
+        """Mock the urllib3.PoolManager.request function to return a predetermined health check status."""
+        mock_get = mocker.patch("urllib3.PoolManager.request")
         response = mocker.MagicMock()
-        response.status_code = 200
+        response.status = 200
         response.json.return_value = {"key": "value"}  # You can customize the response as needed
 
-        # Set the return value of requests.get to the mocked response
+        # Set the return value of urllib3.PoolManager.request to the mocked response
         mock_get.return_value = response
 
         return mock_get
@@ -36,26 +50,195 @@ class TestMultiMinio:
     @staticmethod
     def test_multiminio_get_object():
         """Assert that when calling get_object it will use client2 and return the expected result"""
-        client1 = MagicMock(spec=Minio)
-        base_url = MagicMock(spec=ParseResult)
-        base_url.geturl.return_value = "http://minio1.com"
-        client1._base_url = base_url
+        client1 = _mock_client("http://minio1.com")
         client1.get_object.side_effect = [Exception("Client 1 failed initially"), "Client 1 Result"]
 
-        client2 = MagicMock(spec=Minio)
-        base_url = MagicMock(spec=ParseResult)
-        base_url.geturl.return_value = "http://minio2.com"
-        client2._base_url = base_url
+        client2 = _mock_client("http://minio2.com")
 
         def get_object2(bucket_name, object_nam, *args, **kwargs):
             return {(BUCKET1, OBJECT1): EXPECTED_RESULT}[(bucket_name, object_nam)]
 
         client2.get_object = get_object2
-        with patch("multiminio.multiminio.requests.get") as mock_get:
+        with patch("multiminio.multiminio.urllib3.PoolManager.request") as mock_get:
             # First call to health check returns a timeout for client1 and success for client2
             mock_get.side_effect = [FAIL_HEALTH, SUCCESS_HEALTH]
-            multi_minio = MultiMinio([client1, client2])
-            result = multi_minio.get_object(BUCKET1, OBJECT1)
+            with MultiMinio([client1, client2]) as multi_minio:
+                result = multi_minio.get_object(BUCKET1, OBJECT1)
             assert result == EXPECTED_RESULT
-            expected_health_calls = [call("http://minio1.com/minio/health/live", timeout=5.0), call("http://minio2.com/minio/health/live", timeout=5.0)]
+            expected_health_calls = [call("GET", "http://minio1.com/minio/health/live"), call("GET", "http://minio2.com/minio/health/live")]
             mock_get.assert_has_calls(expected_health_calls, any_order=False)
+
+    @staticmethod
+    def test_retrieve_clients_health_doesnt_wait_for_stalled_client():
+        """Assert that a hanging health probe is reported as failed once the health check timeout elapses"""
+        release = Event()
+        client1 = _mock_client("http://minio1.com")
+        client2 = _mock_client("http://minio2.com")
+
+        def get(method, url, *args, **kwargs):
+            if url.startswith("http://minio1.com"):
+                release.wait(5.0)
+            return SUCCESS_HEALTH
+
+        with patch("multiminio.multiminio.urllib3.PoolManager.request", side_effect=get):
+            with MultiMinio([client1, client2], health_check_timeout=0.1) as multi_minio:
+                statuses = multi_minio._retrieve_clients_health()
+                release.set()
+        assert isinstance(statuses[0].status_code, TimeoutError)
+        assert statuses[1].status_code == 200
+
+    @staticmethod
+    def test_failed_client_isnt_probed_again_during_cooldown():
+        """Assert that a client which failed its health check is skipped without a network probe while its circuit is open"""
+        client1 = _mock_client("http://minio1.com")
+
+        with patch("multiminio.multiminio.urllib3.PoolManager.request") as mock_get:
+            mock_get.side_effect = [FAIL_HEALTH, SUCCESS_HEALTH]
+            with MultiMinio([client1]) as multi_minio:
+                first_status = multi_minio._check_health_status(0)
+                second_status = multi_minio._check_health_status(0)
+                assert mock_get.call_count == 1
+                assert second_status is first_status
+
+                multi_minio._cooldown_until[0] = 0.0
+                assert multi_minio._check_health_status(0).status_code == 200
+                assert mock_get.call_count == 2
+                assert multi_minio._consecutive_fails[0] == 0
+
+    @staticmethod
+    def test_client_recovering_during_outage_is_found_despite_open_circuit():
+        """Assert that while all clients are down, a client that comes back is found by the next probe even though its circuit is open"""
+        client1 = _mock_client("http://minio1.com")
+        client1.get_object.side_effect = Exception("Client 1 failed")
+        client2 = _mock_client("http://minio2.com")
+        client2.get_object.return_value = EXPECTED_RESULT
+        recovery_ts = time.monotonic() + 0.2
+
+        def request(method, url, *args, **kwargs):
+            if url.startswith("http://minio2.com") and time.monotonic() >= recovery_ts:
+                return SUCCESS_HEALTH
+            raise FAIL_HEALTH
+
+        with patch("multiminio.multiminio.urllib3.PoolManager.request", side_effect=request):
+            with MultiMinio([client1, client2], health_check_timeout=0.05, health_check_interval=0.1, fallback_timeout=1.5) as multi_minio:
+                assert multi_minio.get_object(BUCKET1, OBJECT1) == EXPECTED_RESULT
+
+    @staticmethod
+    def test_concurrent_health_checks_are_coalesced():
+        """Assert that concurrent callers of _retrieve_clients_health share a single round of probes"""
+        client1 = _mock_client("http://minio1.com")
+
+        def get(method, url, *args, **kwargs):
+            time.sleep(0.05)
+            return SUCCESS_HEALTH
+
+        with patch("multiminio.multiminio.urllib3.PoolManager.request", side_effect=get) as mock_get:
+            with MultiMinio([client1], health_check_timeout=1.0) as multi_minio, ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda _: multi_minio._retrieve_clients_health(), range(8)))
+        assert mock_get.call_count == 1
+        assert all(statuses is results[0] for statuses in results)
+
+    @staticmethod
+    def test_fallback_prefers_other_healthy_client_from_fresh_health_statuses():
+        """Assert that a failing client is replaced by another client known to be healthy, without probing again"""
+        client1 = _mock_client("http://minio1.com")
+        client1.get_object.side_effect = Exception("Client 1 failed")
+
+        client2 = _mock_client("http://minio2.com")
+        client2.get_object.return_value = EXPECTED_RESULT
+
+        with patch("multiminio.multiminio.urllib3.PoolManager.request", return_value=SUCCESS_HEALTH) as mock_request:
+            with MultiMinio([client1, client2]) as multi_minio:
+                multi_minio._retrieve_clients_health()
+                assert mock_request.call_count == 2
+                assert multi_minio.get_object(BUCKET1, OBJECT1) == EXPECTED_RESULT
+                assert mock_request.call_count == 2
+
+    @staticmethod
+    def test_clients_with_same_url_are_probed_once():
+        """Assert that clients sharing an endpoint get a single health probe whose result applies to all of them"""
+        clients = [_mock_client(url) for url in ("http://minio1.com", "http://minio1.com", "http://minio2.com")]
+
+        with patch("multiminio.multiminio.urllib3.PoolManager.request", return_value=SUCCESS_HEALTH) as mock_request:
+            with MultiMinio(clients) as multi_minio:
+                statuses = multi_minio._retrieve_clients_health()
+        assert mock_request.call_count == 2
+        assert len(statuses) == 3
+        assert statuses[0] is statuses[1]
+        assert statuses[2].status_code == 200
+
+    @staticmethod
+    def test_context_manager_releases_health_check_resources():
+        """Assert that leaving the context shuts down the health check executor and that close() can be called again"""
+        client1 = _mock_client("http://minio1.com")
+
+        with MultiMinio([client1]) as multi_minio:
+            assert isinstance(multi_minio, MultiMinio)
+        with pytest.raises(RuntimeError):
+            multi_minio._health_executor.submit(lambda: None)
+        multi_minio.close()
+
+    @staticmethod
+    def test_load_balance_type_values_are_member_names():
+        """Assert that LoadBalanceType values are the member names, as they were with strenum.StrEnum"""
+        assert LoadBalanceType("FALLBACK") is LoadBalanceType.FALLBACK
+        assert [str(member) for member in LoadBalanceType] == ["FALLBACK", "ROUND_ROBIN", "RANDOM"]
+
+    @staticmethod
+    @pytest.mark.parametrize("deprecated_kwargs", [{"ts_type": float}, {"max_try_timeout": 30.0}])
+    def test_deprecated_parameters_are_accepted_with_warning(deprecated_kwargs):
+        """Assert that passing a deprecated parameter still constructs the instance and warns"""
+        (name,) = deprecated_kwargs
+        with pytest.warns(DeprecationWarning, match=name):
+            with MultiMinio([_mock_client("http://minio1.com")], **deprecated_kwargs) as multi_minio:
+                assert isinstance(multi_minio, MultiMinio)
+
+    @staticmethod
+    def test_health_probes_verify_certificates_like_minio(monkeypatch):
+        """Assert that the health probe pool verifies certificates against SSL_CERT_FILE, falling back to certifi, like Minio does"""
+        monkeypatch.delenv("SSL_CERT_FILE", raising=False)
+        with MultiMinio([_mock_client("https://minio1.com")]) as multi_minio:
+            assert multi_minio._probe_pm.connection_pool_kw["cert_reqs"] == "CERT_REQUIRED"
+            assert multi_minio._probe_pm.connection_pool_kw["ca_certs"] == certifi.where()
+
+        monkeypatch.setenv("SSL_CERT_FILE", "/etc/ssl/custom-ca.pem")
+        with MultiMinio([_mock_client("https://minio1.com")]) as multi_minio:
+            assert multi_minio._probe_pm.connection_pool_kw["ca_certs"] == "/etc/ssl/custom-ca.pem"
+
+    @staticmethod
+    def test_call_after_close_raises_minio_exception():
+        """Assert that a closed instance refuses calls with a MinioException instead of failing later during a failover"""
+        client1 = _mock_client("http://minio1.com")
+        with MultiMinio([client1]) as multi_minio:
+            pass
+        with pytest.raises(MinioException, match="closed"):
+            multi_minio.get_object(BUCKET1, OBJECT1)
+        client1.get_object.assert_not_called()
+
+    @staticmethod
+    def test_fast_binding_calls_original_minio_function_on_client():
+        """Assert that with MAX_COMPATIBILITY disabled the Minio function runs with the client as self, bound only once"""
+
+        class FastMultiMinio(MultiMinio):
+            MAX_COMPATIBILITY = False
+
+        def bucket_exists(self, bucket_name):  # Sentinel standing in for Minio.bucket_exists
+            return (self, bucket_name)
+
+        client1 = _mock_client("http://minio1.com")
+        with FastMultiMinio([client1]) as multi_minio, patch.object(Minio, "bucket_exists", bucket_exists):
+            assert multi_minio._execute_with_fallback(Minio.bucket_exists, BUCKET1) == (client1, BUCKET1)
+            bound = multi_minio._recs[0].bound["bucket_exists"]
+            assert bound.__func__ is Minio.bucket_exists
+            assert bound.__self__ is client1
+            assert multi_minio._execute_with_fallback(Minio.bucket_exists, BUCKET1) == (client1, BUCKET1)
+            assert multi_minio._recs[0].bound["bucket_exists"] is bound
+        client1.bucket_exists.assert_not_called()
+
+    @staticmethod
+    def test_wrappers_dont_override_multiminio_own_methods():
+        """Assert that only Minio methods not defined by MultiMinio itself are replaced by fallback wrappers"""
+        for method_name in _WRAPPED_METHODS:
+            method = vars(MultiMinio)[method_name]
+            assert getattr(method, "__wrapped__", None) is getattr(Minio, method_name) or method.__qualname__.startswith("MultiMinio.")
+        assert MultiMinio.close.__qualname__ == "MultiMinio.close"